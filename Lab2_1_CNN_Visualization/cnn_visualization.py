@@ -1,14 +1,13 @@
 import os
 import numpy as np
+import matplotlib
+matplotlib.use('Agg')  # Non-interactive raster backend: figures are only saved to PNG
 import matplotlib.pyplot as plt
 from PIL import Image
-import matplotlib.gridspec as gridspec
 
 # Import Keras models and preprocessing
 import tensorflow as tf
 from tensorflow.keras.applications import VGG16
-from tensorflow.keras.applications.vgg16 import preprocess_input
-from tensorflow.keras.preprocessing import image
 from tensorflow.keras.models import Model
 
 # ============================================================================
@@ -21,6 +20,11 @@ INPUT_IMAGE_PATH = "input_images/chest_image.jpg"
 OUTPUT_DIR = "output_images"
 LAYERS_TO_VISUALIZE = ["block1_conv1", "block3_conv3", "block5_conv3"]
 NUM_FILTERS_DISPLAY = 16  
+VGG16_MEAN_BGR = (103.939, 116.779, 123.68)  # ImageNet channel means (caffe mode)
+BATCH_SIZE = 8  # Images per forward pass in the tf.data pipeline
+USE_XLA = True  # JIT-compile the activation model with XLA
+USE_INT8_TFLITE = False  # Run an INT8-quantized TFLite copy of the activation model instead
+SAVE_DPI = 100  # Output PNG resolution (10x11 inch figure -> 1000x1100 pixels)
 
 # ============================================================================
 # UTILITY FUNCTIONS
@@ -37,29 +41,35 @@ def create_output_directory():
         print(f"✓ Output directory already exists: {OUTPUT_DIR}")
 
 
-def load_and_preprocess_image(image_path):
+def load_image_dataset(image_paths, batch_size=BATCH_SIZE):
     try:
-        # Load image
-        if not os.path.exists(image_path):
-            raise FileNotFoundError(f"Image not found: {image_path}")
+        for image_path in image_paths:
+            if not os.path.exists(image_path):
+                raise FileNotFoundError(f"Image not found: {image_path}")
         
-        img = image.load_img(image_path, target_size=(IMAGE_HEIGHT, IMAGE_WIDTH))
-        print(f"✓ Image loaded successfully: {image_path}")
-        print(f"  Image shape: {img.size}")
-        
-        # Convert to array
-        img_array = image.img_to_array(img)
-        
-        # Add batch dimension
-        img_array = np.expand_dims(img_array, axis=0)
+        def load_and_preprocess(path):
+            # Decode and resize (nearest, like keras load_img) to the VGG16 input size
+            img = tf.io.decode_image(tf.io.read_file(path), channels=3,
+                                     expand_animations=False)
+            img = tf.image.resize(img, [IMAGE_HEIGHT, IMAGE_WIDTH], method='nearest')
+            
+            # Preprocess for VGG16 (ImageNet normalization, same as preprocess_input):
+            # reorder RGB -> BGR while still uint8, then one cast and mean subtraction
+            img = img[..., ::-1]
+            return tf.cast(img, tf.float32) - VGG16_MEAN_BGR
         
-        # Preprocess for VGG16 (ImageNet normalization)
-        preprocessed_img = preprocess_input(img_array.copy())
+        # Parallel decode, batched for the model and prefetched to overlap I/O with compute
+        dataset = (
+            tf.data.Dataset.from_tensor_slices(list(image_paths))
+            .map(load_and_preprocess, num_parallel_calls=tf.data.AUTOTUNE)
+            .batch(batch_size)
+            .prefetch(tf.data.AUTOTUNE)
+        )
         
-        print(f"✓ Image preprocessed successfully")
-        print(f"  Preprocessed shape: {preprocessed_img.shape}")
+        print(f"✓ Image pipeline ready: {len(image_paths)} image(s), batch size {batch_size}")
+        print(f"  Input shape: {dataset.element_spec.shape}")
         
-        return preprocessed_img, img_array
+        return dataset
         
     except Exception as e:
         print(f"✗ Error loading/preprocessing image: {e}")
@@ -90,41 +100,119 @@ def print_model_summary(model):
     print("="*80 + "\n")
 
 
-def create_activation_models(base_model, layer_names):
-    activation_models = {}
-    
+def build_multi_output_model(base_model, layer_names):
+    # Single multi-output model: the shared VGG16 stem runs once for all layers.
+    # Outputs are in layer_names order
     try:
+        outputs = [base_model.get_layer(layer_name).output for layer_name in layer_names]
+        activation_model = Model(inputs=base_model.input, outputs=outputs)
+        
         for layer_name in layer_names:
-            # Get the layer
-            target_layer = base_model.get_layer(layer_name)
-            
-            # Create sub-model
-            activation_model = Model(
-                inputs=base_model.input,
-                outputs=target_layer.output
-            )
-            
-            activation_models[layer_name] = activation_model
-            print(f"✓ Created activation model for: {layer_name}")
+            print(f"✓ Added activation output for: {layer_name}")
+        
+        return activation_model
             
     except Exception as e:
-        print(f"✗ Error creating activation models: {e}")
+        print(f"✗ Error creating activation model: {e}")
+        raise
+
+
+def create_activation_model(base_model, layer_names):
+    activation_model = build_multi_output_model(base_model, layer_names)
+    
+    # Fixed input signature keeps the forward pass in graph mode with a single trace;
+    # XLA fuses the conv + bias + ReLU chains of the fixed-shape VGG16 stem.
+    # Graph mode comes from tf.function rather than tf.compat.v1.disable_eager_execution():
+    # the forward pass is the only TF work in this script, so the v1 Session API would add
+    # nothing but a global switch that also breaks tf.data iteration and .numpy()
+    @tf.function(jit_compile=USE_XLA, input_signature=[
+        tf.TensorSpec((None, IMAGE_HEIGHT, IMAGE_WIDTH, 3), tf.float32)
+    ])
+    def compiled_forward(x):
+        # The whole multi-layer traversal is one graph returning {layer_name: activations}
+        activations = activation_model(x, training=False)
+        return dict(zip(layer_names, activations))
+    
+    def forward(x):
+        # XLA compiles one program per batch size, so pad batches up to a power of
+        # two: at most log2(BATCH_SIZE) + 1 compilations, and no padding for 1 image
+        num_images = int(x.shape[0])
+        padding = (1 << (num_images - 1).bit_length()) - num_images
+        if padding:
+            x = tf.pad(x, [[0, padding], [0, 0], [0, 0], [0, 0]])
+        return {layer_name: activations[:num_images]
+                for layer_name, activations in compiled_forward(x).items()}
+    
+    # Warm-up call so tracing/compilation is not attributed to feature extraction
+    forward(tf.zeros((1, IMAGE_HEIGHT, IMAGE_WIDTH, 3), tf.float32))
+    print(f"✓ Compiled forward pass (XLA: {USE_XLA})")
+    
+    return forward
+
+
+def create_int8_activation_model(base_model, layer_names, representative_paths):
+    activation_model = build_multi_output_model(base_model, layer_names)
+    
+    try:
+        # Calibrate activation ranges on the images that will be visualized
+        def representative_dataset():
+            for image_batch in load_image_dataset(representative_paths, batch_size=1):
+                yield [image_batch]
+        
+        # Full-integer quantization: int8 weights and activations, float in/out
+        converter = tf.lite.TFLiteConverter.from_keras_model(activation_model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        tflite_model = converter.convert()
+        
+        interpreter = tf.lite.Interpreter(model_content=tflite_model,
+                                          num_threads=os.cpu_count())
+        interpreter.allocate_tensors()
+        print(f"✓ Converted activation model to INT8 TFLite ({len(tflite_model) / 1e6:.1f} MB)")
+        
+    except Exception as e:
+        print(f"✗ Error creating INT8 activation model: {e}")
         raise
     
-    return activation_models
+    # The raw output tensors are not in Keras output order, but the signature's
+    # outputs are: output_0 .. output_{n-1} correspond to layer_names in order
+    runner = interpreter.get_signature_runner()
+    signature = next(iter(interpreter.get_signature_list().values()))
+    input_name = signature['inputs'][0]
+    output_names = [f'output_{i}' for i in range(len(layer_names))]
+    if sorted(signature['outputs']) != sorted(output_names):
+        raise ValueError(f"Unexpected TFLite signature outputs: {signature['outputs']}")
+    
+    def forward(x):
+        # The interpreter runs one image at a time; outputs come back dequantized
+        layer_outputs = [[] for _ in layer_names]
+        for sample in np.asarray(x, dtype=np.float32):
+            results = runner(**{input_name: sample[np.newaxis]})
+            for outputs, output_name in zip(layer_outputs, output_names):
+                outputs.append(results[output_name])
+        return {layer_name: np.concatenate(outputs, axis=0)
+                for layer_name, outputs in zip(layer_names, layer_outputs)}
+    
+    return forward
 
 
-def extract_feature_maps(image, activation_models):
+def extract_feature_maps(image_dataset, activation_model, layer_names):
     feature_maps = {}
     
     try:
-        for layer_name, model in activation_models.items():
-            # Get activations
-            activations = model.predict(image, verbose=0)
-            feature_maps[layer_name] = activations
+        # One forward pass per batch returns the activations of every requested layer
+        batch_outputs = {layer_name: [] for layer_name in layer_names}
+        for image_batch in image_dataset:
+            for layer_name, layer_activations in activation_model(image_batch).items():
+                batch_outputs[layer_name].append(np.asarray(layer_activations))
+        
+        for layer_name, outputs in batch_outputs.items():
+            layer_activations = np.concatenate(outputs, axis=0)
+            feature_maps[layer_name] = layer_activations
             
             print(f"✓ Extracted feature maps from {layer_name}")
-            print(f"  Shape: {activations.shape} (batch, height, width, channels)")
+            print(f"  Shape: {layer_activations.shape} (batch, height, width, channels)")
             
     except Exception as e:
         print(f"✗ Error extracting feature maps: {e}")
@@ -133,51 +221,72 @@ def extract_feature_maps(image, activation_models):
     return feature_maps
 
 
-def normalize_image_for_display(img_array):
-    # Handle different input shapes
-    if len(img_array.shape) == 4:
-        img_array = img_array[0]  # Remove batch dimension
-    
-    # Normalize to 0-1 range
-    min_val = img_array.min()
-    max_val = img_array.max()
+def normalize_filters_for_display(activations):
+    # Per-filter min/max for a (height, width, filters) block in one reduction
+    min_vals = activations.min(axis=(0, 1))
+    value_range = activations.max(axis=(0, 1)) - min_vals
     
-    if max_val - min_val > 0:
-        normalized = (img_array - min_val) / (max_val - min_val)
-    else:
-        normalized = img_array
+    # Constant filters are left unchanged (no range to stretch)
+    has_range = value_range > 0
+    min_vals = np.where(has_range, min_vals, 0)
+    scale = np.divide(1.0, value_range, out=np.ones_like(value_range), where=has_range)
     
+    normalized = activations - min_vals
+    normalized *= scale
     return normalized
 
 
-def visualize_layer_filters(feature_maps, layer_name, num_filters=16):
+def build_filter_mosaic(normalized_stack, grid_size=4):
+    # Tile the (height, width, filters) stack into one image; each row of tiles
+    # is preceded by a transparent (NaN) band that holds the filter labels
+    height, width, num_filters = normalized_stack.shape
+    gap = max(1, height // 5)
+    
+    mosaic = np.full((grid_size * (height + gap), grid_size * (width + gap) - gap),
+                     np.nan, dtype=np.float32)
+    
+    for filter_idx in range(min(num_filters, grid_size * grid_size)):
+        i, j = divmod(filter_idx, grid_size)
+        top = i * (height + gap) + gap
+        left = j * (width + gap)
+        mosaic[top:top + height, left:left + width] = normalized_stack[:, :, filter_idx]
+    
+    return mosaic, gap
+
+
+def create_visualization_figure():
+    # One figure is reused for every layer; visualize_layer_filters redraws its axes
+    # Figure proportions match the near-square mosaic, so no bbox_inches='tight' re-render
+    fig, ax = plt.subplots(figsize=(10, 11))
+    fig.subplots_adjust(left=0.01, right=0.99, bottom=0.01, top=0.93)
+    return fig, ax
+
+
+def visualize_layer_filters(fig, ax, feature_maps, layer_name, num_filters=16):
     # Extract single sample and limit to first num_filters
     activations = feature_maps[0, :, :, :num_filters]  # (height, width, num_filters)
+    height, width = activations.shape[:2]
+    
+    # Normalize all displayed filters at once instead of one by one
+    normalized_stack = normalize_filters_for_display(activations)
     
     # Calculate grid dimensions
     grid_size = 4  # 4x4 grid
     
-    # Create figure with proper layout
-    fig = plt.figure(figsize=(12, 10))
-    gs = gridspec.GridSpec(grid_size, grid_size, hspace=0.4, wspace=0.3)
+    # Render every filter as one tiled image: a single imshow instead of 16 axes
+    mosaic, gap = build_filter_mosaic(normalized_stack, grid_size)
     
-    filter_idx = 0
-    for i in range(grid_size):
-        for j in range(grid_size):
-            ax = fig.add_subplot(gs[i, j])
-            
-            # Get single filter activation
-            filter_activation = activations[:, :, filter_idx]
-            
-            # Normalize for display
-            normalized = normalize_image_for_display(filter_activation)
-            
-            # Display
-            im = ax.imshow(normalized, cmap='viridis', interpolation='bilinear')
-            ax.set_title(f'Filter {filter_idx + 1}', fontsize=10, fontweight='bold')
-            ax.axis('off')
-            
-            filter_idx += 1
+    # Clear the previous layer's image and labels from the shared axes
+    ax.clear()
+    ax.imshow(mosaic, cmap='viridis', interpolation='nearest', vmin=0.0, vmax=1.0)
+    ax.axis('off')
+    
+    # Label exactly the tiles build_filter_mosaic drew
+    for filter_idx in range(min(normalized_stack.shape[-1], grid_size * grid_size)):
+        i, j = divmod(filter_idx, grid_size)
+        ax.text(j * (width + gap) + width / 2, i * (height + gap) + gap / 2,
+                f'Filter {filter_idx + 1}', ha='center', va='center',
+                fontsize=10, fontweight='bold')
     
     # Overall title
     title = f'{layer_name} - First 16 Filters (4x4 Grid)'
@@ -191,7 +300,7 @@ def save_visualization(fig, layer_name):
         filename = f"{layer_name}.png"
         filepath = os.path.join(OUTPUT_DIR, filename)
         
-        fig.savefig(filepath, dpi=150, bbox_inches='tight')
+        fig.savefig(filepath, dpi=SAVE_DPI)
         print(f"✓ Saved visualization: {filepath}")
         
     except Exception as e:
@@ -231,17 +340,24 @@ def main():
         print("\nSTEP 3: Model Summary...")
         print_model_summary(vgg16_model)
         
-        # Step 4: Create activation models for selected layers
-        print("STEP 4: Creating activation models...")
-        activation_models = create_activation_models(vgg16_model, LAYERS_TO_VISUALIZE)
+        # Step 4: Create a multi-output activation model for selected layers
+        print("STEP 4: Creating activation model...")
+        if USE_INT8_TFLITE:
+            activation_model = create_int8_activation_model(
+                vgg16_model, LAYERS_TO_VISUALIZE, [INPUT_IMAGE_PATH]
+            )
+        else:
+            activation_model = create_activation_model(vgg16_model, LAYERS_TO_VISUALIZE)
         
         # Step 5: Load and preprocess image
         print("\nSTEP 5: Loading and preprocessing image...")
-        preprocessed_img, original_img = load_and_preprocess_image(INPUT_IMAGE_PATH)
+        image_dataset = load_image_dataset([INPUT_IMAGE_PATH])
         
         # Step 6: Extract feature maps
         print("\nSTEP 6: Extracting feature maps...")
-        feature_maps_dict = extract_feature_maps(preprocessed_img, activation_models)
+        feature_maps_dict = extract_feature_maps(
+            image_dataset, activation_model, LAYERS_TO_VISUALIZE
+        )
         
         # Step 7: Display layer statistics
         print("\nSTEP 7: Layer Statistics...")
@@ -250,11 +366,14 @@ def main():
         
         # Step 8: Visualize and save filters
         print("\nSTEP 8: Visualizing and saving filters...")
-        for layer_name, feature_maps in feature_maps_dict.items():
-            print(f"\nProcessing {layer_name}...")
-            fig = visualize_layer_filters(feature_maps, layer_name, NUM_FILTERS_DISPLAY)
-            save_visualization(fig, layer_name)
-            plt.close(fig)  # Close figure to free memory
+        fig, ax = create_visualization_figure()
+        try:
+            for layer_name, feature_maps in feature_maps_dict.items():
+                print(f"\nProcessing {layer_name}...")
+                visualize_layer_filters(fig, ax, feature_maps, layer_name, NUM_FILTERS_DISPLAY)
+                save_visualization(fig, layer_name)
+        finally:
+            plt.close(fig)  # Close the shared figure once to free memory
         
         # Success message
         print("\n" + "="*80)